@@ -1,150 +1,285 @@
 import os
-import json
+import orjson
 import logging
 import re
+import sys
+import time
+import functools
+import asyncio
+import ijson
+import pickle
+import tempfile
+from collections import defaultdict, OrderedDict
 from azure.core.credentials import AzureKeyCredential
-from azure.search.documents import SearchClient
+from azure.core.pipeline.transport import AioHttpTransport
+from azure.search.documents.aio import SearchClient
 import azure.functions as func
 from azure.storage.blob import BlobServiceClient
-from azure.data.tables import TableServiceClient, TableClient
-from typing import Dict, Any
+from azure.data.tables.aio import TableClient
+from typing import Dict, Any, List, Optional, Tuple
 
 app = func.FunctionApp()
 # Initialize OpenAI client
 AZURE_SEARCH_SERVICE_NAME = os.getenv("AZURE_SEARCH_SERVICE_NAME", "your-search-service")
 AZURE_SEARCH_API_KEY = os.getenv("AZURE_SEARCH_API_KEY", "your-api-key")
 AZURE_SEARCH_INDEX = os.getenv("AZURE_SEARCH_INDEX", "food_recall")
+# Filterable Collection(Edm.String) field holding state codes; when unset, state
+# searches fall back to full-text matching on distribution_pattern
+AZURE_SEARCH_STATES_FIELD = os.getenv("AZURE_SEARCH_STATES_FIELD")
 AZURE_SEARCH_ENDPOINT = f"https://{AZURE_SEARCH_SERVICE_NAME}.search.windows.net"
 AZURE_STORAGE_CONNECTION_STRING = os.getenv("AZURE_STORAGE_CONNECTION_STRING")
 ZIPCODE_BLOB_CONTAINER = os.getenv("ZIPCODE_BLOB_CONTAINER")
 ZIPCODE_BLOB_NAME = os.getenv("ZIPCODE_BLOB_NAME")
+ZIPCODE_CACHE_VERSION = 2
+ZIPCODE_CACHE_PATH = os.getenv("ZIPCODE_CACHE_PATH", os.path.join(tempfile.gettempdir(), "zip_cache.pkl"))
 TABLE_NAME = "recallsummaries" 
+CORS_HEADERS = {
+    "Access-Control-Allow-Methods": "GET, POST, OPTIONS",
+    "Access-Control-Allow-Headers": "Content-Type, Authorization",
+}
+NO_SUMMARY_MESSAGE = "No summary available for this recall"
+# Azure Table Storage allows at most 15 comparisons per $filter; one is
+# spent on PartitionKey, leaving 14 RowKey comparisons per query.
+TABLE_FILTER_MAX_ROW_KEYS = 14
+MAX_SUMMARY_BATCH_SIZE = 200
+_ZIP_RE = re.compile(r"^\d{5}$")
+SEARCH_CACHE_TTL_SECONDS = int(os.getenv("SEARCH_CACHE_TTL_SECONDS", "120"))
+SEARCH_CACHE_MAX_ENTRIES = 256
+SEARCH_CACHE_MAX_BYTES = int(os.getenv("SEARCH_CACHE_MAX_BYTES", str(32 * 1024 * 1024)))
+RECENT_RECALLS_MAX_AGE_SECONDS = int(os.getenv("RECENT_RECALLS_MAX_AGE_SECONDS", "120"))
+DEFAULT_SEARCH_LIMIT = 200
+MAX_SEARCH_LIMIT = 1000
+SEARCH_SELECT_FIELDS = "recall_number,reason_for_recall,status,classification,report_date,recall_severity,product_description"
 
+# Clients are created once per worker and reused across invocations so warm
+# instances keep their connection pools instead of re-handshaking per request.
+# Both share one transport, so concurrent calls (e.g. multi-state fan-out)
+# draw keep-alive sockets from a single aiohttp pool.
+_TRANSPORT = AioHttpTransport()
+_SEARCH_CLIENT = SearchClient(
+    endpoint=AZURE_SEARCH_ENDPOINT,
+    index_name=AZURE_SEARCH_INDEX,
+    credential=AzureKeyCredential(AZURE_SEARCH_API_KEY),
+    transport=_TRANSPORT
+)
+_TABLE_CLIENT = TableClient.from_connection_string(
+    conn_str=AZURE_STORAGE_CONNECTION_STRING,
+    table_name=TABLE_NAME,
+    transport=_TRANSPORT
+)
+
+
+# Short-lived cache of search results keyed by normalized query, so repeated
+# queries are served from memory instead of hitting Azure Search (and its 429s).
+# Bodies are kept pre-serialized and bounded by count and total size, since keys
+# come from free text and a page can hold up to MAX_SEARCH_LIMIT results.
+_SEARCH_CACHE: "OrderedDict[str, Tuple[float, bytes]]" = OrderedDict()
+_SEARCH_CACHE_BYTES = 0
+
+# ZIP, city and state lookups, loaded by the first location search
+_ZIP_LOOKUPS: Optional[Tuple[Dict[str, str], Dict[str, Tuple[str, ...]], frozenset]] = None
+_ZIP_LOOKUPS_LOCK = asyncio.Lock()
+
+# Pre-serialized response for the default recent recalls page. The timer
+# trigger refreshes it every minute; because timers run on a single instance,
+# other instances rebuild their copy on demand once it is older than
+# RECENT_RECALLS_MAX_AGE_SECONDS.
+_RECENT_CACHE: bytes = b""
+_RECENT_CACHE_EXPIRES = 0.0
+
+
+def cors(handler):
+    """Answer CORS preflight requests and attach the shared CORS headers to every response."""
+    @functools.wraps(handler)
+    async def wrapper(req: func.HttpRequest) -> func.HttpResponse:
+        if req.method == "OPTIONS":
+            return func.HttpResponse(status_code=204, headers=CORS_HEADERS)
+        response = await handler(req)
+        response.headers.update(CORS_HEADERS)
+        return response
+    return wrapper
 
 def create_table_client() -> TableClient:
-    """Create and return a TableClient for recall summaries."""
-    table_service = TableServiceClient.from_connection_string(conn_str=AZURE_STORAGE_CONNECTION_STRING)
-    table_client = table_service.get_table_client(table_name=TABLE_NAME)
-    return table_client
+    """Return the shared async TableClient for recall summaries."""
+    return _TABLE_CLIENT
+
+def read_zipcode_cache(etag):
+    """Return lookups from the local snapshot if it was built from the blob with this ETag."""
+    try:
+        with open(ZIPCODE_CACHE_PATH, "rb") as f:
+            cached = pickle.load(f)
+    except FileNotFoundError:
+        return None
+    except Exception as e:
+        logging.warning(f"Ignoring unreadable ZIP code cache {ZIPCODE_CACHE_PATH}: {e}")
+        return None
+    
+    if cached.get("etag") != etag or cached.get("version") != ZIPCODE_CACHE_VERSION:
+        return None
+    return cached["lookups"]
+
+def write_zipcode_cache(etag, lookups):
+    """Persist lookups to local disk so later cold starts can skip the download and parse."""
+    try:
+        tmp_path = f"{ZIPCODE_CACHE_PATH}.{os.getpid()}.tmp"
+        with open(tmp_path, "wb") as f:
+            pickle.dump({"etag": etag, "version": ZIPCODE_CACHE_VERSION, "lookups": lookups}, f, protocol=5)
+        os.replace(tmp_path, ZIPCODE_CACHE_PATH)
+    except Exception as e:
+        logging.warning(f"Could not write ZIP code cache {ZIPCODE_CACHE_PATH}: {e}")
 
 def load_zipcode_data():
     blob_service_client = BlobServiceClient.from_connection_string(AZURE_STORAGE_CONNECTION_STRING)
     blob_client = blob_service_client.get_blob_client(container=ZIPCODE_BLOB_CONTAINER, blob=ZIPCODE_BLOB_NAME)
     
+    # A HEAD request is enough to tell whether the local snapshot is still current
+    etag = blob_client.get_blob_properties().etag
+    cached = read_zipcode_cache(etag)
+    if cached is not None:
+        logging.info("Loaded ZIP code lookups from local cache")
+        return cached
+    
+    # Stream-parse the blob so the raw payload and the full entry list are never held in memory
     stream = blob_client.download_blob()
-    zip_data = json.loads(stream.readall().decode('utf-8'))
- 
     
-    zip_to_state = {str(entry["zip"]): entry["state"] for entry in zip_data}
-    city_to_state = {}
-    for entry in zip_data:
-        city = entry["city"].lower()
-        state = entry["state"]
-        if city not in city_to_state:
-            city_to_state[city] = set()
-        city_to_state[city].add(state)
-
-    return zip_to_state, city_to_state
+    zip_to_state = {}
+    city_to_state = defaultdict(set)
+    for entry in ijson.items(stream, "item"):
+        # Interning keeps one shared string object per state across all entries
+        state = sys.intern(entry["state"])
+        zip_to_state[str(entry["zip"])] = state
+        city_to_state[entry["city"].lower()].add(state)
+
+    # Cities map to a handful of states; tuples are far smaller than sets and
+    # can be returned to callers as-is
+    city_lookup = {city: tuple(sorted(states)) for city, states in city_to_state.items()}
+    lookups = (zip_to_state, city_lookup)
+    write_zipcode_cache(etag, lookups)
+    return lookups
     
-ZIPCODE_LOOKUP, CITY_LOOKUP = load_zipcode_data()
+async def get_zip_lookups():
+    """Load the ZIP, city and state lookups on first use rather than at import.
+
+    Only location searches need them, so cold starts of the recall detail
+    endpoints no longer wait on the ZIP blob. The blocking download and parse
+    run in a worker thread, once, while other requests keep being served.
+    """
+    global _ZIP_LOOKUPS
+    if _ZIP_LOOKUPS is None:
+        async with _ZIP_LOOKUPS_LOCK:
+            if _ZIP_LOOKUPS is None:
+                zip_lookup, city_lookup = await asyncio.to_thread(load_zipcode_data)
+                # ~50 distinct codes, normalized to upper case to match the upper-cased query
+                state_set = frozenset({state.upper() for state in set(zip_lookup.values())})
+                _ZIP_LOOKUPS = (zip_lookup, city_lookup, state_set)
+    return _ZIP_LOOKUPS
 
 
 
 @app.route(route="api/recent_recalls", auth_level=func.AuthLevel.FUNCTION)
-def recent_recalls(req: func.HttpRequest) -> func.HttpResponse:
+@cors
+async def recent_recalls(req: func.HttpRequest) -> func.HttpResponse:
     logging.info('Recent recalls from AI Search Service.')
-    headers = {        
-        "Access-Control-Allow-Methods": "GET, OPTIONS",
-        "Access-Control-Allow-Headers": "Content-Type",
-    }
     try:        
-        results = query_azure_search()
-        recall_list = []
-        for result in results:
-            recall_list.append(result)
+        limit = get_limit(req)
+        if limit == DEFAULT_SEARCH_LIMIT:
+            body = await get_recent_recalls_body()
+        else:
+            key = f"recent:{limit}"
+            body = get_cached_search(key)
+            if body is None:
+                body = build_recent_recalls_body(await query_azure_search(top=limit))
+                set_cached_search(key, body)
             
         return func.HttpResponse(
-            json.dumps({
-                "recalls": recall_list, 
-                "count": len(recall_list),
-                "query": "search_text",
-                "search_type": "Recent Recalls"}),
+            body,
             status_code=200,
-            mimetype="application/json",
-            headers=headers
+            mimetype="application/json"
             )       
     
     except Exception as e:
         logging.error(f"Error processing request: {e}")
         return func.HttpResponse(
-            json.dumps({"error": str(e)}),
+            orjson.dumps({"error": str(e)}),
             status_code=500,
             mimetype="application/json")
 
-@app.route(route="api/recall/{recall_id}", auth_level=func.AuthLevel.FUNCTION, methods=["GET"])
-def get_recall_by_id(req: func.HttpRequest) -> func.HttpResponse:
+@app.schedule(schedule="0 */1 * * * *", arg_name="timer", run_on_startup=False, use_monitor=False)
+async def refresh_recent_recalls(timer: func.TimerRequest) -> None:
+    logging.info('Refreshing recent recalls cache.')
+    try:
+        await refresh_recent_recalls_body()
+    except Exception as e:
+        logging.error(f"Error refreshing recent recalls cache: {e}")
+
+def build_recent_recalls_body(recall_list: List[Dict[str, Any]]) -> bytes:
+    """Serialize the recent recalls response payload."""
+    return orjson.dumps({
+        "recalls": recall_list, 
+        "count": len(recall_list),
+        "query": "search_text",
+        "search_type": "Recent Recalls"}, default=str)
+
+async def refresh_recent_recalls_body() -> bytes:
+    """Query Azure Search for the default recent recalls page and cache the serialized response."""
+    global _RECENT_CACHE, _RECENT_CACHE_EXPIRES
+    body = build_recent_recalls_body(await query_azure_search())
+    _RECENT_CACHE = body
+    _RECENT_CACHE_EXPIRES = time.monotonic() + RECENT_RECALLS_MAX_AGE_SECONDS
+    return body
+
+async def get_recent_recalls_body() -> bytes:
+    """Return the cached recent recalls response, refreshing it if this instance's copy is stale."""
+    if _RECENT_CACHE and _RECENT_CACHE_EXPIRES > time.monotonic():
+        return _RECENT_CACHE
+    return await refresh_recent_recalls_body()
+
+@app.route(route="api/recall/{recall_id}", auth_level=func.AuthLevel.FUNCTION, methods=["GET", "OPTIONS"])
+@cors
+async def get_recall_by_id(req: func.HttpRequest) -> func.HttpResponse:
     logging.info('Processing recall request by ID')
     recall_id = req.route_params.get('recall_id')
     
-    headers = {            
-            "Access-Control-Allow-Methods": "GET, OPTIONS",
-            "Access-Control-Allow-Headers": "Content-Type, Authorization",
-        }
-    
-    if req.method == "OPTIONS":
-        return func.HttpResponse(
-            status_code=204,  # No content
-            headers=headers
-        )
-        
     try:        
         if not recall_id:
             return func.HttpResponse(
-                    json.dumps({"error": "Recall ID is required"}),
+                    orjson.dumps({"error": "Recall ID is required"}),
                     status_code=400,
-                    mimetype="application/json",
-                    headers=headers
+                    mimetype="application/json"
                 )
             
-        table_client = create_table_client()
         partition_key = "recall"  # Based on the screenshot
         row_key = recall_id
         
         try:
             # Get the entity from the table
-            entity = table_client.get_entity(partition_key=partition_key, row_key=row_key)
+            table_client = create_table_client()
+            entity = await table_client.get_entity(partition_key=partition_key, row_key=row_key)
             ai_response = entity.get("summary", "No summary available for this recall")
         except Exception as table_error:
             logging.error(f"Error retrieving recall from table storage: {table_error}")
             ai_response = "No summary available for this recall"
             
         return func.HttpResponse(
-            json.dumps({
+            orjson.dumps({
                 "summary": ai_response,                 
                 "query": "search_text",
                 "search_type": "Recall Details"}),
             status_code=200,
-            mimetype="application/json",
-            headers=headers
+            mimetype="application/json"
             ) 
                 
     except Exception as e:
         logging.error(f"Error retrieving recall: {e}")
-        
-    return func.HttpResponse(
-                json.dumps({"error": str(e)}),
-                status_code=500,
-                mimetype="application/json",
-                headers=headers
-            )
+        return func.HttpResponse(
+            orjson.dumps({"error": str(e)}),
+            status_code=500,
+            mimetype="application/json"
+        )
     
 @app.route(route="api/recall_details", auth_level=func.AuthLevel.FUNCTION)
-def recall_details(req: func.HttpRequest) -> func.HttpResponse:
-    
-    headers = {        
-        "Access-Control-Allow-Methods": "GET, OPTIONS",
-        "Access-Control-Allow-Headers": "Content-Type",
-    }
+@cors
+async def recall_details(req: func.HttpRequest) -> func.HttpResponse:
     recall_number = req.params.get('recall_number')
     logging.info(f"Recall details {recall_number}")    
     
@@ -157,27 +292,25 @@ def recall_details(req: func.HttpRequest) -> func.HttpResponse:
             recall_number = req_body.get('recall_number')
 
     if recall_number:
-        # Initialize Table client
-        table_client = create_table_client()
         partition_key = "recall"  # Based on the screenshot
         row_key = recall_number
         
         try:
             # Get the entity from the table
-            entity = table_client.get_entity(partition_key=partition_key, row_key=row_key)
+            table_client = create_table_client()
+            entity = await table_client.get_entity(partition_key=partition_key, row_key=row_key)
             ai_response = entity.get("summary", "No summary available for this recall")
         except Exception as e:
             logging.error(f"Error retrieving recall from table storage: {e}")
             ai_response = "No summary available for this recall"
         
         return func.HttpResponse(
-            json.dumps({
+            orjson.dumps({
                 "summary": ai_response,                 
                 "query": "search_text",
                 "search_type": "Recall Details"}),
             status_code=200,
-            mimetype="application/json",
-            headers=headers
+            mimetype="application/json"
             )
     else:
         return func.HttpResponse(
@@ -185,8 +318,75 @@ def recall_details(req: func.HttpRequest) -> func.HttpResponse:
              status_code=200
         )
 
-@app.route(route="api/search", auth_level=func.AuthLevel.FUNCTION, methods=["GET"])
-def search(req: func.HttpRequest) -> func.HttpResponse:   
+@app.route(route="api/recalls/summaries", auth_level=func.AuthLevel.FUNCTION, methods=["POST", "OPTIONS"])
+@cors
+async def recall_summaries(req: func.HttpRequest) -> func.HttpResponse:
+    logging.info('Processing batch recall summaries request')
+    try:
+        req_body = req.get_json()
+    except ValueError:
+        req_body = {}
+    
+    recall_ids = req_body.get("ids") if isinstance(req_body, dict) else None
+    if not isinstance(recall_ids, list) or not recall_ids:
+        return func.HttpResponse(
+            orjson.dumps({"error": "A non-empty list of recall ids is required"}),
+            status_code=400,
+            mimetype="application/json"
+        )
+    if len(recall_ids) > MAX_SUMMARY_BATCH_SIZE:
+        return func.HttpResponse(
+            orjson.dumps({"error": f"At most {MAX_SUMMARY_BATCH_SIZE} recall ids can be requested at once"}),
+            status_code=400,
+            mimetype="application/json"
+        )
+    
+    try:
+        summaries = await get_summaries(recall_ids)
+        return func.HttpResponse(
+            orjson.dumps(summaries),
+            status_code=200,
+            mimetype="application/json"
+        )
+    except Exception as e:
+        logging.error(f"Error retrieving recall summaries: {e}")
+        return func.HttpResponse(
+            orjson.dumps({"error": str(e)}),
+            status_code=500,
+            mimetype="application/json"
+        )
+
+async def get_summaries(recall_ids: List[str]) -> Dict[str, str]:
+    """Fetch summaries for many recalls using batched RowKey filters instead of one lookup per id."""
+    recall_ids = list(dict.fromkeys(str(recall_id) for recall_id in recall_ids))
+    summaries = {recall_id: NO_SUMMARY_MESSAGE for recall_id in recall_ids}
+    
+    chunks = [recall_ids[i:i + TABLE_FILTER_MAX_ROW_KEYS] for i in range(0, len(recall_ids), TABLE_FILTER_MAX_ROW_KEYS)]
+    for entities in await asyncio.gather(*(query_summary_chunk(chunk) for chunk in chunks)):
+        for entity in entities:
+            summaries[entity["RowKey"]] = entity.get("summary", NO_SUMMARY_MESSAGE)
+    
+    return summaries
+
+async def query_summary_chunk(recall_ids: List[str]) -> List[Dict[str, Any]]:
+    """Fetch the summary rows for up to TABLE_FILTER_MAX_ROW_KEYS recalls in one Table query."""
+    parameters = {"pk": "recall"}
+    row_key_clauses = []
+    for i, recall_id in enumerate(recall_ids):
+        parameters[f"rk{i}"] = recall_id
+        row_key_clauses.append(f"RowKey eq @rk{i}")
+    query_filter = f"PartitionKey eq @pk and ({' or '.join(row_key_clauses)})"
+    
+    table_client = create_table_client()
+    return [
+        entity async for entity in table_client.query_entities(
+            query_filter, parameters=parameters, select=["RowKey", "summary"]
+        )
+    ]
+
+@app.route(route="api/search", auth_level=func.AuthLevel.FUNCTION, methods=["GET", "OPTIONS"])
+@cors
+async def search(req: func.HttpRequest) -> func.HttpResponse:   
     
     search_text = req.params.get('q', '')
     if not search_text:
@@ -197,73 +397,178 @@ def search(req: func.HttpRequest) -> func.HttpResponse:
         except ValueError:
             pass
     
-    results = query_azure_search(search_text)
+    try:
+        body = await search_response_body(search_text, get_limit(req))
+    except Exception as e:
+        return func.HttpResponse(
+            orjson.dumps({"error": str(e)}),
+            status_code=500,
+            mimetype="application/json"
+        )
+    
     return func.HttpResponse(
-        json.dumps(results, default=str), 
+        body, 
         status_code=200, 
         mimetype="application/json"
     )
 
 
-def query_azure_search(search_text=""):
+def get_limit(req: func.HttpRequest) -> int:
+    """Read the optional `limit` query parameter, clamped to what Azure Search allows."""
+    try:
+        limit = int(req.params.get('limit', DEFAULT_SEARCH_LIMIT))
+    except ValueError:
+        limit = DEFAULT_SEARCH_LIMIT
+    return max(1, min(limit, MAX_SEARCH_LIMIT))
+
+def search_cache_key(search_info: Dict[str, Any], top: int) -> str:
+    """Build a cache key from the detected search type, its normalized value and the page size."""
+    value = search_info.get("value")
+    if isinstance(value, (list, tuple)):
+        value = ",".join(sorted(value))
+    return f"search:{search_info['type']}:{str(value or '').lower()}:{top}"
+
+def drop_cached_search(key: str) -> None:
+    """Remove key from the search cache and release its bytes."""
+    global _SEARCH_CACHE_BYTES
+    _SEARCH_CACHE_BYTES -= len(_SEARCH_CACHE.pop(key)[1])
+
+def get_cached_search(key: str) -> Optional[bytes]:
+    """Return the cached response body for key, or None if missing or expired."""
+    cached = _SEARCH_CACHE.get(key)
+    if cached is None:
+        return None
+    if cached[0] <= time.monotonic():
+        drop_cached_search(key)
+        return None
+    _SEARCH_CACHE.move_to_end(key)
+    return cached[1]
+
+def set_cached_search(key: str, body: bytes) -> None:
+    """Store a response body, dropping expired entries and then the least recently used ones to stay within bounds."""
+    global _SEARCH_CACHE_BYTES
+    if len(body) > SEARCH_CACHE_MAX_BYTES:
+        return
+    now = time.monotonic()
+    for cached_key in [k for k, (expires, _) in _SEARCH_CACHE.items() if expires <= now]:
+        drop_cached_search(cached_key)
+    if key in _SEARCH_CACHE:
+        drop_cached_search(key)
+    while _SEARCH_CACHE and (len(_SEARCH_CACHE) >= SEARCH_CACHE_MAX_ENTRIES
+                             or _SEARCH_CACHE_BYTES + len(body) > SEARCH_CACHE_MAX_BYTES):
+        drop_cached_search(next(iter(_SEARCH_CACHE)))
+    _SEARCH_CACHE[key] = (now + SEARCH_CACHE_TTL_SECONDS, body)
+    _SEARCH_CACHE_BYTES += len(body)
+
+def build_states_filter(states) -> str:
+    """Build an OData filter matching documents distributed to any of the given states."""
+    values = ",".join(state.replace("'", "''") for state in states)
+    return f"{AZURE_SEARCH_STATES_FIELD}/any(s: search.in(s, '{values}', ','))"
+
+async def run_search(**search_kwargs) -> List[Dict[str, Any]]:
+    """Run one Azure Search query and collect its results."""
+    search_results = await _SEARCH_CLIENT.search(**search_kwargs)
+    return [result async for result in search_results]
+
+async def search_states_concurrently(states, top: int) -> List[Dict[str, Any]]:
+    """Search distribution_pattern once per state in parallel and merge by report date.
+
+    A single OR-joined query lets one state's matches crowd out the others
+    before `top` is applied; per-state queries give each state its own page.
+    """
+    per_state = await asyncio.gather(*(
+        run_search(
+            search_text=state,
+            search_fields=["distribution_pattern"],
+            select=SEARCH_SELECT_FIELDS,
+            order_by="report_date desc",
+            top=top
+        )
+        for state in states
+    ))
+    if len(per_state) == 1:
+        return per_state[0]
+    
+    merged = {}
+    for results in per_state:
+        for result in results:
+            merged.setdefault(result.get("recall_number"), result)
+    return sorted(merged.values(), key=lambda r: r.get("report_date") or "", reverse=True)[:top]
+
+async def search_response_body(search_text: str, top: int) -> bytes:
+    """Return the serialized search response, served from the search cache when possible."""
+    search_info = await identify_search_type(search_text)
+    cache_key = search_cache_key(search_info, top)
+    body = get_cached_search(cache_key)
+    if body is None:
+        body = orjson.dumps(await execute_search(search_info, top), default=str)
+        set_cached_search(cache_key, body)
+    return body
+
+async def query_azure_search(search_text="", top=DEFAULT_SEARCH_LIMIT):
+    """Run a search and return the result dicts, bypassing the response cache."""
+    return await execute_search(await identify_search_type(search_text), top)
+
+async def execute_search(search_info: Dict[str, Any], top: int) -> List[Dict[str, Any]]:
     try:    
-        search_results = []
-        search_client = SearchClient(
-                endpoint=AZURE_SEARCH_ENDPOINT,
-                index_name=AZURE_SEARCH_INDEX,
-                credential=AzureKeyCredential(AZURE_SEARCH_API_KEY)
-            )
-                
-        search_info = identify_search_type(search_text)
-        
         if search_info["type"] == "state":
             state_values = search_info["value"]
-            search_results = search_client.search(
-                search_text=state_values, 
-                search_fields=["distribution_pattern"],                      
-                select="recall_number,reason_for_recall,status,classification,report_date,recall_severity,product_description",
-                order_by="report_date desc",
-                top=200
-            )
+            if isinstance(state_values, str):
+                state_values = [state_values]
+            
+            if AZURE_SEARCH_STATES_FIELD:
+                # Exact-match filter on the states collection skips full-text analysis and scoring
+                return await run_search(
+                    search_text="*",
+                    filter=build_states_filter(state_values),
+                    select=SEARCH_SELECT_FIELDS,
+                    order_by="report_date desc",
+                    top=top
+                )
+            return await search_states_concurrently(state_values, top)
         elif search_info["type"] == "free_text":
-            search_results = search_client.search(
+            return await run_search(
                 search_text=search_info["value"],
                 search_fields=["product_description", "reason_for_recall", "classification", "recalling_firm"],
-                select="recall_number,reason_for_recall,status,classification,report_date,recall_severity,product_description",
+                select=SEARCH_SELECT_FIELDS,
                 order_by="report_date desc",
-                top=200
+                top=top
             )       
-            
-        return [result for result in search_results]
+        return []
         
     except Exception as e:
         logging.error(f"Error querying Azure Search: {e}")
-        return func.HttpResponse(
-            json.dumps({"error": str(e)}),
-            status_code=500,
-            mimetype="application/json"
-        ) 
+        raise
 
 
-def identify_search_type(search_text):
+async def identify_search_type(search_text):
     """Determine whether input is a ZIP code, state, or city."""
     search_text = search_text.strip()
     # Log the search text for debugging
     logging.info(f"Search text received: {search_text}")    
 
-    # Check if it's a ZIP code (5-digit numeric)
-    if re.match(r"^\d{5}$", search_text):
-        state = ZIPCODE_LOOKUP.get(search_text)
-        return {"type": "state", "value": state} if state else {"type": "unknown"}
+    # An empty query (recent recalls) never needs the ZIP lookups
+    if not search_text:
+        return {"type": "free_text", "value": search_text}
+
+    zip_lookup, city_lookup, state_set = await get_zip_lookups()
 
     # Check if it's a state abbreviation (e.g., "CA")
-    elif len(search_text) == 2 and search_text.upper() in set(ZIPCODE_LOOKUP.values()):
-        print(f"Search type >>>>  {search_text}")
-        return {"type": "state", "value": search_text.upper()}
+    if len(search_text) == 2:
+        state = search_text.upper()
+        if state in state_set:
+            print(f"Search type >>>>  {search_text}")
+            return {"type": "state", "value": state}
+
+    # Check if it's a ZIP code (5-digit numeric)
+    elif len(search_text) == 5 and _ZIP_RE.match(search_text):
+        state = zip_lookup.get(search_text)
+        return {"type": "state", "value": state} if state else {"type": "unknown"}
 
     # Check if it's a city
-    elif search_text.lower() in CITY_LOOKUP:
-        states = list(CITY_LOOKUP[search_text.lower()])
+    city = search_text.lower()
+    if city in city_lookup:
+        states = city_lookup[city]
         return {"type": "state", "value": states} if states else {"type": "unknown"}
 
     # If none of the above, treat as a free-text search
@@ -1,8 +1,8 @@
 import os
 import sys
 import logging
-import time
-from azure.search.documents.indexes import SearchIndexerClient
+import asyncio
+from azure.search.documents.indexes.aio import SearchIndexerClient
 from azure.core.credentials import AzureKeyCredential
 from azure.core.exceptions import ResourceNotFoundError, HttpResponseError
 from dotenv import load_dotenv
@@ -41,7 +41,7 @@ def get_config():
     return config
 
 def get_indexer_client(endpoint, api_key):
-    """Create and return a SearchIndexerClient."""
+    """Create and return an async SearchIndexerClient."""
     try:
         return SearchIndexerClient(
             endpoint=endpoint,
@@ -54,14 +54,19 @@ def get_indexer_client(endpoint, api_key):
         logger.error(f"Failed to create search indexer client: {str(e)}")
         return None
 
-def check_indexer_status(client, indexer_name, max_wait_seconds=120):
-    """Check the status of the indexer and wait until it's completed or failed."""
+async def check_indexer_status(client, indexer_name, max_wait_seconds=120,
+                               initial_interval=2, max_interval=30):
+    """Check the status of the indexer and wait until it's completed or failed.
+
+    Polls with exponential backoff so short runs finish quickly while long runs
+    don't issue a status call every few seconds.
+    """
     wait_time = 0
-    sleep_interval = 10
+    sleep_interval = initial_interval
     
     while wait_time < max_wait_seconds:
         try:
-            status = client.get_indexer_status(indexer_name)
+            status = await client.get_indexer_status(indexer_name)
             
             if status.last_result:
                 if status.last_result.status == "success":
@@ -72,9 +77,11 @@ def check_indexer_status(client, indexer_name, max_wait_seconds=120):
                     return False
             
             # If still running or pending, wait and check again
-            logger.info(f"Indexer status: {status.status}. Waiting {sleep_interval} seconds...")
-            time.sleep(sleep_interval)
+            sleep_interval = min(sleep_interval, max_wait_seconds - wait_time)
+            logger.info(f"Indexer status: {status.status}. Waiting {sleep_interval:.1f} seconds...")
+            await asyncio.sleep(sleep_interval)
             wait_time += sleep_interval
+            sleep_interval = min(sleep_interval * 1.5, max_interval)
             
         except Exception as e:
             logger.error(f"Error checking indexer status: {str(e)}")
@@ -83,6 +90,37 @@ def check_indexer_status(client, indexer_name, max_wait_seconds=120):
     logger.warning(f"Timed out after waiting {max_wait_seconds} seconds for indexer to complete")
     return False
 
+async def get_indexer_run_status():
+    """Return the latest indexer execution status without waiting for it to finish.
+
+    Lets callers start the indexer with status checking skipped and look up the
+    outcome later, instead of holding a Function invocation open while polling.
+    """
+    config = get_config()
+    if not config:
+        return None
+    
+    try:
+        client = get_indexer_client(config["search_endpoint"], config["search_api_key"])
+        if not client:
+            return None
+        
+        async with client:
+            status = await client.get_indexer_status(config["indexer_name"])
+        
+        last_result = status.last_result
+        return {
+            "indexer": config["indexer_name"],
+            "status": status.status,
+            "last_result": last_result.status if last_result else None,
+            "item_count": last_result.item_count if last_result else None,
+            "failed_item_count": last_result.failed_item_count if last_result else None,
+            "error_message": last_result.error_message if last_result else None,
+        }
+    except Exception as e:
+        logger.error(f"Error getting indexer status: {str(e)}")
+        return None
+
 async def run_indexer(check_status=True, max_wait_seconds=120):
     """Run the Azure Search indexer and check its status."""
     # Get configuration
@@ -96,23 +134,24 @@ async def run_indexer(check_status=True, max_wait_seconds=120):
         if not client:
             return False
         
-        # Run the indexer
-        logger.info(f"Starting indexer '{config['indexer_name']}'...")
-        client.run_indexer(config["indexer_name"])
-        
-        # Check indexer status if requested
-        if check_status:
-            success = check_indexer_status(client, config["indexer_name"], max_wait_seconds)
+        async with client:
+            # Run the indexer
+            logger.info(f"Starting indexer '{config['indexer_name']}'...")
+            await client.run_indexer(config["indexer_name"])
             
-            if success:
-                logger.info("ETL indexer process completed successfully.")
-                return True
+            # Check indexer status if requested
+            if check_status:
+                success = await check_indexer_status(client, config["indexer_name"], max_wait_seconds)
+                
+                if success:
+                    logger.info("ETL indexer process completed successfully.")
+                    return True
+                else:
+                    logger.error("ETL indexer process failed.")
+                    return False
             else:
-                logger.error("ETL indexer process failed.")
-                return False
-        else:
-            logger.info("Indexer started. Status checking skipped.")
-            return True
+                logger.info("Indexer started. Status checking skipped.")
+                return True
             
     except ResourceNotFoundError as e:
         logger.error(f"Indexer not found: {str(e)}")
@@ -126,7 +165,6 @@ async def run_indexer(check_status=True, max_wait_seconds=120):
 
 if __name__ == "__main__":
     logger.info("Starting Azure Search indexer ETL process...")
-    import asyncio
     success = asyncio.run(run_indexer())
     exit_code = 0 if success else 1
     logger.info(f"Exiting with code {exit_code}")
@@ -1,19 +1,24 @@
-import json
+import orjson
 import asyncio
 import datetime
 import os
 import logging
 import time
-import tempfile
-from typing import Dict, Any, List, Optional
+import hashlib
+import random
+import re
+import ijson
+import aiohttp
+from typing import Dict, Any, List, Optional, Tuple
 from dataclasses import dataclass
+from collections import OrderedDict, deque
 import sys
-import ssl
-from openai import AsyncAzureOpenAI
+from openai import AsyncAzureOpenAI, RateLimitError, APITimeoutError, APIConnectionError, InternalServerError
 from azure.core.exceptions import ServiceRequestError
 from azure.data.tables.aio import TableServiceClient, TableClient
 from azure.core.exceptions import ResourceExistsError
-from azure.storage.blob import BlobServiceClient
+from azure.core.pipeline.transport import AioHttpTransport
+from azure.storage.blob.aio import BlobServiceClient as AsyncBlobServiceClient
 
 # Configure logging
 logging.basicConfig(
@@ -23,6 +28,51 @@ logging.basicConfig(
 logger = logging.getLogger(__name__)
 
 TABLE_NAME = "recallsummaries"
+SYSTEM_MESSAGE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "system.txt")
+DEFAULT_SYSTEM_MESSAGE = "You are a helpful assistant that analyzes food recall data and creates consumer-friendly summaries."
+SUMMARY_CACHE_MAX_ENTRIES = 10000
+# Azure Table Storage allows at most 15 comparisons per $filter; one is
+# spent on PartitionKey, leaving 14 RowKey comparisons per query.
+TABLE_FILTER_MAX_ROW_KEYS = 14
+TABLE_TRANSACTION_MAX_OPERATIONS = 100
+SUMMARY_MAX_TOKENS = 3000
+# How long the writer holds finished summaries waiting to fill a transaction
+WRITE_FLUSH_INTERVAL_SECONDS = 2.0
+# Rough prompt size estimate used until the response reports actual usage
+CHARS_PER_TOKEN = 4
+
+# Summary instructions sent in the system message, identical for every recall
+SUMMARY_INSTRUCTIONS = """Generate a recall summary in natural language with the following standardized sections for the JSON data in the user message. 
+    The summary is should be easy to render and display in html page. The tone should be informative and appropriate to the severity level.
+    
+    1. Recall Overview: Provide a short description of the recall event. 
+    2. Product Details: Mention the product name, classification, and recall status. 
+    3. Reason for Recall: Explain the reason for the recall. Provide Wikipedia link if available.
+    4. Health Risks: Describe any risks associated with the issue. 
+    5. Distribution & Affected Areas: Mention where the product was distributed. If mentioned "nationwide" it means across US. Otherwise specify the country and states
+    6. Action Required: Provide instructions for consumers. 
+    7. Additional Information: Include recall date and any other relevant details. 
+    8. Reference: Provide the FDA link for further reference: https://www.fda.gov/safety/recalls-market-withdrawals-safety-alerts
+    9. Contact Information: Provide the company's contact information. Do not display the contact method if it is not provided.   
+    Make these main sections in bold: Recall Overview, Product Details, Reason for Recall, Health Risks, Distribution & Affected Areas, Additional Information, Reference, Contact Information."""
+
+# Backoff in seconds per retry, capped at the last entry and scaled by random jitter
+RETRY_DELAYS = (2, 4, 8, 16, 32, 60)
+# Seeded per worker so retries from workers started together don't line up
+_retry_random = random.Random(os.urandom(16))
+
+# Request quota reported by the last Azure OpenAI response; None until a response is seen
+_rate_limit_remaining: Optional[int] = None
+_rate_limit_reset_at: float = 0.0
+# Azure OpenAI may omit x-ratelimit-reset-requests; assume the quota frees up after this long
+DEFAULT_RATE_LIMIT_RESET_SECONDS = 10.0
+_DURATION_PART_RE = re.compile(r"(\d+(?:\.\d+)?)(ms|s|m|h)")
+_DURATION_SCALES = {"ms": 0.001, "s": 1.0, "m": 60.0, "h": 3600.0}
+
+_openai_client: Optional[AsyncAzureOpenAI] = None
+
+# Summaries already seen by this worker, so warm re-runs skip Table Storage lookups
+_SUMMARY_CACHE: "OrderedDict[str, Tuple[str, str]]" = OrderedDict()
 
 @dataclass
 class RecallItem:
@@ -32,8 +82,125 @@ class RecallItem:
     summary: str = None
     processed: bool = False
     error: str = None
+    data_json: bytes = None  # Canonical JSON of data, serialized once for the prompt and data_hash
+    data_hash: str = None
+    up_to_date: bool = False  # Stored summary already matches data_hash; nothing to write
+
+class AdaptiveConcurrencyLimiter:
+    """Async context manager bounding in-flight requests with an AIMD limit.
+
+    Each success adds alpha / limit, so the limit grows by about alpha per round
+    of requests. A throttling event multiplies it by beta once: entering returns
+    the current decrease epoch, and throttles from requests admitted before the
+    last decrease are ignored.
+    """
+    def __init__(self, initial: int, minimum: int = 1, maximum: int = 64, alpha: float = 0.5, beta: float = 0.5):
+        self._limit = float(initial)
+        self._minimum = minimum
+        self._maximum = max(maximum, initial)
+        self._alpha = alpha
+        self._beta = beta
+        self._in_flight = 0
+        self._epoch = 0  # Number of decreases so far
+        self._condition = asyncio.Condition()
+
+    @property
+    def maximum(self) -> int:
+        return self._maximum
+
+    @property
+    def limit(self) -> int:
+        return max(self._minimum, int(self._limit))
+
+    async def __aenter__(self):
+        async with self._condition:
+            await self._condition.wait_for(lambda: self._in_flight < self.limit)
+            self._in_flight += 1
+            return self._epoch
+
+    async def __aexit__(self, exc_type, exc, tb):
+        async with self._condition:
+            self._in_flight -= 1
+            self._condition.notify_all()
+
+    def on_success(self, remaining_requests: Optional[int] = None) -> None:
+        """Grow the limit, unless the server reports too little quota left to use it."""
+        if remaining_requests is not None and remaining_requests < self.limit:
+            return
+        self._limit = min(self._maximum, self._limit + self._alpha / self._limit)
+
+    def on_throttle(self, request_epoch: int) -> None:
+        """Back off after a 429 or server error, once per congestion event."""
+        if request_epoch < self._epoch:
+            # Sent before the last decrease, which already accounted for it
+            return
+        self._epoch += 1
+        self._limit = max(self._minimum, self._limit * self._beta)
+        logger.info(f"Throttled by Azure OpenAI, concurrency limit lowered to {self.limit}")
+
+class SlidingWindowRateLimiter:
+    """Keep requests and tokens sent in the last window_seconds under RPM and TPM limits.
+
+    A limit of 0 disables that check. Token counts start as an estimate and are
+    corrected with the usage the response reports.
+    """
+    def __init__(self, requests_per_window: int = 0, tokens_per_window: int = 0, window_seconds: float = 60.0):
+        self._max_requests = requests_per_window
+        self._max_tokens = tokens_per_window
+        self._window = window_seconds
+        self._entries = deque()  # [timestamp, tokens] per request, oldest first
+        self._tokens = 0
+        self._lock = asyncio.Lock()
+
+    def _expire(self, now: float) -> None:
+        while self._entries and self._entries[0][0] + self._window <= now:
+            self._tokens -= self._entries.popleft()[1]
 
-async def get_table_client() -> Optional[TableClient]:
+    def _has_room(self, tokens: int) -> bool:
+        if self._max_requests and len(self._entries) >= self._max_requests:
+            return False
+        # A single request larger than the whole budget still goes through on an empty window
+        if self._max_tokens and self._entries and self._tokens + tokens > self._max_tokens:
+            return False
+        return True
+
+    async def acquire(self, tokens: int) -> Optional[list]:
+        """Wait until the request fits in the window, then record it and return its entry."""
+        if not self._max_requests and not self._max_tokens:
+            return None
+        # Held while sleeping so waiting requests are admitted in order
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                self._expire(now)
+                if self._has_room(tokens):
+                    entry = [now, tokens]
+                    self._entries.append(entry)
+                    self._tokens += tokens
+                    return entry
+                await asyncio.sleep(self._entries[0][0] + self._window - now)
+
+    def record_usage(self, entry: Optional[list], tokens: int) -> None:
+        """Replace a request's estimated tokens with its actual usage."""
+        # Entries past the window are dropped (or about to be) and no longer count
+        if entry is None or entry[0] + self._window <= time.monotonic():
+            return
+        self._tokens += tokens - entry[1]
+        entry[1] = tokens
+
+# Caps concurrent Azure OpenAI requests for the whole run rather than per batch,
+# adapting between 1 and OPENAI_MAX_CONCURRENCY as throttling is observed
+_openai_limiter = AdaptiveConcurrencyLimiter(
+    initial=int(os.environ.get("OPENAI_CONCURRENCY", "16")),
+    maximum=int(os.environ.get("OPENAI_MAX_CONCURRENCY", "64"))
+)
+# Deployment quota per minute; leave unset to rely on throttling responses alone
+_openai_window = SlidingWindowRateLimiter(
+    requests_per_window=int(os.environ.get("OPENAI_RPM_LIMIT", "0")),
+    tokens_per_window=int(os.environ.get("OPENAI_TPM_LIMIT", "0"))
+)
+
+async def get_table_client(transport: AioHttpTransport) -> Optional[TableClient]:
     """Create and return an Azure Table Storage client with proper error handling."""
     try:
         connection_string = os.environ.get('AZURE_STORAGE_CONNECTION_STRING')
@@ -42,13 +209,8 @@ async def get_table_client() -> Optional[TableClient]:
             logger.warning("Azure Storage connection string not provided. Continuing without Table Storage.")
             return None
         
-        # Configure SSL context to handle certificate verification issues
-        ssl_context = ssl.create_default_context()
-        ssl_context.check_hostname = False
-        ssl_context.verify_mode = ssl.CERT_NONE
-        
         # Create the TableServiceClient using the connection string
-        table_service = TableServiceClient.from_connection_string(conn_str=connection_string, connection_verify=False)
+        table_service = TableServiceClient.from_connection_string(conn_str=connection_string, transport=transport)
         
         # Get a client to the specific table
         table_client = table_service.get_table_client(table_name=TABLE_NAME)
@@ -66,82 +228,158 @@ async def get_table_client() -> Optional[TableClient]:
         logger.warning(f"Failed to connect to Azure Table Storage: {str(e)}. Continuing without storage.")
         return None
 
-def create_summary_prompt(recall_data: Dict[Any, Any]) -> str:
-    """Create a prompt for generating a recall summary."""
-    prompt = f"""    
-    Generate a recall summary in natural language with the following standardized sections for the given JSON data. 
-    The summary is should be easy to render and display in html page. The tone should be informative and appropriate to the severity level.
-    
-    1. Recall Overview: Provide a short description of the recall event. 
-    2. Product Details: Mention the product name, classification, and recall status. 
-    3. Reason for Recall: Explain the reason for the recall. Provide Wikipedia link if available.
-    4. Health Risks: Describe any risks associated with the issue. 
-    5. Distribution & Affected Areas: Mention where the product was distributed. If mentioned "nationwide" it means across US. Otherwise specify the country and states
-    6. Action Required: Provide instructions for consumers. 
-    7. Additional Information: Include recall date and any other relevant details. 
-    8. Reference: Provide the FDA link for further reference: https://www.fda.gov/safety/recalls-market-withdrawals-safety-alerts
-    9. Contact Information: Provide the company's contact information. Do not display the contact method if it is not provided.   
-    Make these main sections in bold: Recall Overview, Product Details, Reason for Recall, Health Risks, Distribution & Affected Areas, Additional Information, Reference, Contact Information. 
-    Here is JSON Data: {json.dumps(recall_data, indent=2, default=str)}
-    """    
-    return prompt.strip()
+def load_system_message() -> str:
+    """Read the system message from system.txt, falling back to a default if not available."""
+    try:
+        with open(SYSTEM_MESSAGE_PATH, "r", encoding="utf8") as f:
+            return f.read().strip()
+    except Exception as e:
+        logger.warning(f"Could not read system.txt: {str(e)}. Using default system message.")
+        return DEFAULT_SYSTEM_MESSAGE
+
+# Read once at import instead of once per recall
+SYSTEM_MESSAGE = load_system_message()
+# Identical for every request so the service can reuse the cached prompt prefix;
+# only the recall JSON in the user message varies
+SUMMARY_SYSTEM_MESSAGE = f"{SYSTEM_MESSAGE}\n\n{SUMMARY_INSTRUCTIONS}"
+
+def get_openai_client() -> Optional[AsyncAzureOpenAI]:
+    """Return the shared Azure OpenAI client, creating it on first use.
+
+    Reusing one client keeps its HTTP connection pool warm across the
+    concurrent summary requests instead of opening new connections per recall.
+    """
+    global _openai_client
+    if _openai_client is None:
+        azure_oai_endpoint = os.environ.get("AZURE_OAI_ENDPOINT")
+        azure_oai_key = os.environ.get("AZURE_OAI_KEY")
+        azure_oai_api_version = os.environ.get("AZURE_OAI_API_VERSION")
+        
+        if not all([azure_oai_endpoint, azure_oai_key, azure_oai_api_version]):
+            return None
+        
+        _openai_client = AsyncAzureOpenAI(
+            azure_endpoint=azure_oai_endpoint,
+            api_key=azure_oai_key,
+            api_version=azure_oai_api_version,
+            # Retries are handled in generate_summary_with_retry so throttling reaches the limiters
+            max_retries=0
+        )
+    return _openai_client
+
+def serialize_recall_data(recall_data: Dict[Any, Any]) -> bytes:
+    """Serialize a recall record once, in a canonical form shared by the prompt and the content hash."""
+    return orjson.dumps(recall_data, option=orjson.OPT_SORT_KEYS | orjson.OPT_NON_STR_KEYS, default=str)
+
+def create_summary_prompt(data_json: bytes) -> str:
+    """Create the user message for a recall summary: the recall data as JSON."""
+    return data_json.decode()
+
+def get_retry_after(error: Exception) -> Optional[float]:
+    """Return the delay in seconds requested by a throttled response's Retry-After headers, if any."""
+    response = getattr(error, "response", None)
+    if response is None:
+        return None
+    for header, scale in (("retry-after-ms", 0.001), ("retry-after", 1.0)):
+        value = response.headers.get(header)
+        if value:
+            try:
+                return float(value) * scale
+            except ValueError:
+                continue
+    return None
+
+def parse_reset_duration(value: str) -> Optional[float]:
+    """Parse a rate limit reset value such as "1s", "6m0s" or "20ms" into seconds."""
+    parts = _DURATION_PART_RE.findall(value)
+    if not parts:
+        try:
+            return float(value)
+        except ValueError:
+            return None
+    return sum(float(amount) * _DURATION_SCALES[unit] for amount, unit in parts)
+
+def record_rate_limit(headers) -> None:
+    """Track the remaining request quota and its reset time from response headers."""
+    global _rate_limit_remaining, _rate_limit_reset_at
+    remaining = headers.get("x-ratelimit-remaining-requests")
+    if remaining is None:
+        return
+    try:
+        _rate_limit_remaining = int(remaining)
+    except ValueError:
+        return
+    reset = headers.get("x-ratelimit-reset-requests")
+    reset_seconds = parse_reset_duration(reset) if reset else None
+    if reset_seconds is None:
+        reset_seconds = DEFAULT_RATE_LIMIT_RESET_SECONDS
+    _rate_limit_reset_at = time.monotonic() + reset_seconds
+
+async def wait_for_rate_limit(requests_needed: int) -> None:
+    """Sleep until the request quota resets if it cannot cover the upcoming requests."""
+    global _rate_limit_remaining
+    if _rate_limit_remaining is None or _rate_limit_remaining >= requests_needed:
+        return
+    delay = _rate_limit_reset_at - time.monotonic()
+    if delay > 0:
+        logger.info(f"{_rate_limit_remaining} requests left in the rate limit window, waiting {delay:.2f}s for it to reset")
+        await asyncio.sleep(delay)
+    # The window has reset; the next response reports the fresh quota
+    _rate_limit_remaining = None
 
 async def generate_summary_with_retry(recall_item: RecallItem, 
-                                      max_retries: int = 3, 
-                                      base_delay: float = 2.0) -> RecallItem:
+                                      max_retries: int = 4) -> RecallItem:
     """Generate a summary with exponential backoff retry for transient errors."""
     if recall_item.processed:
         return recall_item
         
-    prompt = create_summary_prompt(recall_item.data)
-    system_message = "You are a helpful assistant that analyzes food recall data and creates consumer-friendly summaries."
-    
-    # Try to read system message from file, fall back to default if not available
-    try:
-        with open("system.txt", "r", encoding="utf8") as f:
-            system_message = f.read().strip()
-    except Exception as e:
-        logger.warning(f"Could not read system.txt: {str(e)}. Using default system message.")
-    
+    if recall_item.data_json is None:
+        recall_item.data_json = serialize_recall_data(recall_item.data)
+    prompt = create_summary_prompt(recall_item.data_json)
     messages = [
-        {"role": "system", "content": system_message},
+        {"role": "system", "content": SUMMARY_SYSTEM_MESSAGE},
         {"role": "user", "content": prompt},
     ]
+    # Quota counts the completion budget up front, so include max_tokens
+    estimated_tokens = (len(SUMMARY_SYSTEM_MESSAGE) + len(prompt)) // CHARS_PER_TOKEN + SUMMARY_MAX_TOKENS
     
-    # Get config from environment variables
-    azure_oai_endpoint = os.environ.get("AZURE_OAI_ENDPOINT")
-    azure_oai_key = os.environ.get("AZURE_OAI_KEY")
     azure_oai_deployment = os.environ.get("AZURE_OAI_DEPLOYMENT")
-    azure_oai_api_version = os.environ.get("AZURE_OAI_API_VERSION")
+    client = get_openai_client()
     
-    if not all([azure_oai_endpoint, azure_oai_key, azure_oai_deployment, azure_oai_api_version]):
+    if not client or not azure_oai_deployment:
         error_msg = "Missing required Azure OpenAI configuration"
         logger.error(error_msg)
         recall_item.error = error_msg
         return recall_item
     
-    client = AsyncAzureOpenAI(
-        azure_endpoint=azure_oai_endpoint,
-        api_key=azure_oai_key,
-        api_version=azure_oai_api_version
-    )
-    
     retry_count = 0
     while retry_count <= max_retries:
         try:
-            response = await client.chat.completions.create(
-                model=azure_oai_deployment,
-                messages=messages,
-                temperature=0.7,
-                max_tokens=3000
-            )
+            # Bound in-flight requests across all batches; backoff sleeps happen outside the limiter
+            async with _openai_limiter as request_epoch:
+                # Take the window slot only once the request is about to be sent, so
+                # time spent queued on the limiter doesn't count against the window
+                window_entry = await _openai_window.acquire(estimated_tokens)
+                raw_response = await client.chat.completions.with_raw_response.create(
+                    model=azure_oai_deployment,
+                    messages=messages,
+                    temperature=0.7,
+                    max_tokens=SUMMARY_MAX_TOKENS
+                )
+            record_rate_limit(raw_response.headers)
+            _openai_limiter.on_success(_rate_limit_remaining)
+            response = raw_response.parse()
+            if response.usage:
+                _openai_window.record_usage(window_entry, response.usage.total_tokens)
             
             recall_item.summary = response.choices[0].message.content.strip()
             recall_item.processed = True
             return recall_item
             
-        except ServiceRequestError as e:
-            # These are network errors that are likely transient
+        except (ServiceRequestError, RateLimitError, APITimeoutError, APIConnectionError, InternalServerError) as e:
+            # Network errors, timeouts, 429s and 5xx responses are likely transient
+            if isinstance(e, (RateLimitError, InternalServerError)):
+                _openai_limiter.on_throttle(request_epoch)
             retry_count += 1
             if retry_count > max_retries:
                 error_msg = f"Max retries exceeded for {recall_item.recall_id}: {str(e)}"
@@ -149,8 +387,10 @@ async def generate_summary_with_retry(recall_item: RecallItem,
                 recall_item.error = error_msg
                 return recall_item
                 
-            # Exponential backoff with jitter
-            delay = min(60, base_delay * (2 ** (retry_count - 1))) * (0.5 + 0.5 * (time.time() % 1))
+            # Prefer the server's Retry-After, otherwise exponential backoff with jitter
+            delay = get_retry_after(e)
+            if delay is None:
+                delay = RETRY_DELAYS[min(retry_count - 1, len(RETRY_DELAYS) - 1)] * _retry_random.uniform(0.5, 1.0)
             logger.info(f"Transient error, retrying in {delay:.2f}s: {str(e)}")
             await asyncio.sleep(delay)
             
@@ -161,99 +401,226 @@ async def generate_summary_with_retry(recall_item: RecallItem,
             recall_item.error = error_msg
             return recall_item
 
-async def process_batch(batch: List[RecallItem], table_client: Optional[TableClient] = None) -> List[RecallItem]:
-    # If table client is not available, mark all items as skipped and don't process them
-    if not table_client:
-        logger.warning("Skipping API calls as Table Storage is not available")
-        for item in batch:
-            item.processed = False
-            item.error = "Skipped due to unavailable Table Storage"
-        return batch
-
-    """Process a batch of recalls."""
-    if table_client:
-        # Pre-check Table Storage to avoid unnecessary API calls
-        for item in batch:
-            if not item.processed:
-                try:
-                    # Query table to check if summary exists
-                    query_filter = f"PartitionKey eq 'recall' and RowKey eq '{item.recall_id}'"
-                    items_found = [entity async for entity in table_client.query_entities(query_filter)]
-                    
-                    if items_found and 'summary' in items_found[0]:
-                        item.summary = items_found[0]['summary']
-                        item.processed = True
-                        logger.info(f"Found existing summary for {item.recall_id} in Table Storage, skipping API call")
-                except Exception as e:
-                    logger.warning(f"Error checking Table Storage for {item.recall_id}: {str(e)}")
-    
-    # Filter out already processed items
-    to_process = [item for item in batch if not item.processed]
-    
-    if not to_process:
-        return batch
+def hash_recall_data(data_json: bytes) -> str:
+    """Return a stable content hash of a serialized recall record, used to tell whether its summary is stale."""
+    return hashlib.blake2b(data_json, digest_size=16).hexdigest()
+
+def get_cached_summary(recall_id: str, data_hash: str) -> Optional[str]:
+    """Return a summary from the in-process cache if it was generated from the same data."""
+    cached = _SUMMARY_CACHE.get(recall_id)
+    if cached is None or cached[0] != data_hash:
+        return None
+    _SUMMARY_CACHE.move_to_end(recall_id)
+    return cached[1]
+
+def cache_summary(recall_id: str, data_hash: str, summary: str) -> None:
+    """Remember a summary, evicting the least recently used entry when full."""
+    _SUMMARY_CACHE[recall_id] = (data_hash, summary)
+    _SUMMARY_CACHE.move_to_end(recall_id)
+    if len(_SUMMARY_CACHE) > SUMMARY_CACHE_MAX_ENTRIES:
+        _SUMMARY_CACHE.popitem(last=False)
+
+async def query_existing_summaries(table_client: TableClient, recall_ids: List[str]) -> Dict[str, Tuple[str, Optional[str]]]:
+    """Fetch stored (summary, dataHash) pairs for up to TABLE_FILTER_MAX_ROW_KEYS recalls in a single query."""
+    parameters = {"pk": "recall"}
+    row_key_clauses = []
+    for i, recall_id in enumerate(recall_ids):
+        parameters[f"rk{i}"] = recall_id
+        row_key_clauses.append(f"RowKey eq @rk{i}")
+    query_filter = f"PartitionKey eq @pk and ({' or '.join(row_key_clauses)})"
     
-    logger.info(f"Processing batch of {len(to_process)} recalls")
+    return {
+        entity['RowKey']: (entity['summary'], entity.get('dataHash'))
+        async for entity in table_client.query_entities(query_filter, parameters=parameters, select=['RowKey', 'summary', 'dataHash'])
+        if entity.get('summary')
+    }
+
+async def load_existing_summaries(batch: List[RecallItem], table_client: TableClient) -> None:
+    """Fill in summaries that already exist for unchanged recall data, from the cache or batched Table Storage queries."""
+    pending = []
+    for item in batch:
+        if item.processed:
+            continue
+        summary = get_cached_summary(item.recall_id, item.data_hash)
+        if summary is None:
+            pending.append(item)
+        else:
+            item.summary = summary
+            item.processed = True
+            item.up_to_date = True
     
-    # Process all items concurrently using asyncio.gather
-    tasks = [generate_summary_with_retry(item) for item in to_process]
-    processed_results = await asyncio.gather(*tasks, return_exceptions=True)
+    if not pending:
+        return
     
-    # Handle results
-    for i, result in enumerate(processed_results):
+    recall_ids = list(dict.fromkeys(item.recall_id for item in pending))
+    chunks = [recall_ids[i:i + TABLE_FILTER_MAX_ROW_KEYS] for i in range(0, len(recall_ids), TABLE_FILTER_MAX_ROW_KEYS)]
+    existing = {}
+    results = await asyncio.gather(*[query_existing_summaries(table_client, chunk) for chunk in chunks], return_exceptions=True)
+    for result in results:
         if isinstance(result, Exception):
-            logger.error(f"Error processing item: {str(result)}")
-            to_process[i].error = str(result)
+            logger.warning(f"Error checking Table Storage for existing summaries: {str(result)}")
         else:
-            to_process[i] = result
+            existing.update(result)
     
-    # Update Table Storage with new summaries
-    if table_client:
-        update_tasks = []
-        updates_count = 0        
-        
-        for item in batch:
-            if item.processed and item.summary and not item.error:
-                try:
-                    # Create entity to insert/update
-                    entity = {
-                        'PartitionKey': 'recall',
-                        'RowKey': item.recall_id,
-                        'summary': item.summary,
-                        'lastUpdated': datetime.datetime.utcnow().isoformat(),
-                        'status': item.data.get('status', 'Unknown')
-                    }
-                    
-                    # Add to tasks list
-                    update_tasks.append(table_client.upsert_entity(entity=entity))
-                    logger.info(f"Prepared update for {item.recall_id}")
-                    updates_count += 1
-                except Exception as e:
-                    logger.warning(f"Error preparing entity for {item.recall_id}: {str(e)}")
-                
-        
-        # Execute all Azure Table Storage operations in a single batch if there's anything to update
-        if updates_count > 0:
+    reused = 0
+    for item in pending:
+        if item.recall_id not in existing:
+            continue
+        summary, stored_hash = existing[item.recall_id]
+        # Rows written before hashing was introduced have no dataHash; reuse
+        # their summary and let the upsert backfill the hash
+        if stored_hash is not None and stored_hash != item.data_hash:
+            logger.info(f"Recall data for {item.recall_id} changed, regenerating summary")
+            continue
+        item.summary = summary
+        item.processed = True
+        item.up_to_date = stored_hash is not None
+        cache_summary(item.recall_id, item.data_hash, summary)
+        reused += 1
+    
+    logger.info(f"Reused {reused} existing summaries from Table Storage for {len(recall_ids)} uncached recalls")
+
+async def save_summaries(items: List[RecallItem], table_client: TableClient) -> int:
+    """Upsert new or changed summaries into Table Storage and return how many were written."""
+    # Keyed by RowKey: a transaction may not touch the same entity twice
+    entities = {}
+    # One timestamp for the whole write
+    now_iso = datetime.datetime.now(datetime.timezone.utc).isoformat()
+    
+    for item in items:
+        if item.processed and item.summary and not item.error and not item.up_to_date:
             try:
-                await asyncio.gather(*update_tasks, return_exceptions=True)
-                logger.info(f"Updated {updates_count} summaries in Table Storage")
+                # Create entity to insert/update
+                entities[item.recall_id] = {
+                    'PartitionKey': 'recall',
+                    'RowKey': item.recall_id,
+                    'summary': item.summary,
+                    'dataHash': item.data_hash,
+                    'lastUpdated': now_iso,
+                    'status': item.data.get('status', 'Unknown')
+                }
             except Exception as e:
-                logger.error(f"Error executing Table Storage updates: {str(e)}")
+                logger.warning(f"Error preparing entity for {item.recall_id}: {str(e)}")
+    
+    # All entities share PartitionKey 'recall', so they can be written as
+    # entity-group transactions of up to 100 operations each
+    operations = [("upsert", entity) for entity in entities.values()]
+    chunks = [operations[i:i + TABLE_TRANSACTION_MAX_OPERATIONS]
+              for i in range(0, len(operations), TABLE_TRANSACTION_MAX_OPERATIONS)]
+    if not chunks:
+        return 0
     
-    return batch
+    results = await asyncio.gather(*[table_client.submit_transaction(chunk) for chunk in chunks], return_exceptions=True)
+    updates_count = 0
+    for chunk, result in zip(chunks, results):
+        if isinstance(result, Exception):
+            logger.error(f"Error executing Table Storage transaction: {str(result)}")
+            continue
+        for _, entity in chunk:
+            cache_summary(entity['RowKey'], entity['dataHash'], entity['summary'])
+        updates_count += len(chunk)
+    logger.info(f"Updated {updates_count} summaries in Table Storage")
+    return updates_count
+
+async def dispatch_batch(batch: List[RecallItem], table_client: TableClient,
+                         summary_queue: asyncio.Queue, write_queue: asyncio.Queue) -> None:
+    """Check a batch for reusable summaries in bulk and route each recall to the workers or the writer."""
+    await load_existing_summaries(batch, table_client)
+    for item in batch:
+        if not item.processed:
+            await summary_queue.put(item)
+        elif not item.up_to_date:
+            # Reused summary from a row without dataHash; rewrite it to backfill the hash
+            write_queue.put_nowait(item)
+
+async def summary_worker(summary_queue: asyncio.Queue, write_queue: asyncio.Queue) -> None:
+    """Summarize recalls from the queue until a None sentinel, handing results to the writer."""
+    while True:
+        item = await summary_queue.get()
+        if item is None:
+            return
+        await wait_for_rate_limit(_openai_limiter.limit)
+        try:
+            await generate_summary_with_retry(item)
+        except Exception as e:
+            logger.error(f"Error processing item: {str(e)}")
+            item.error = str(e)
+        if item.processed and not item.error:
+            write_queue.put_nowait(item)
+
+async def summary_writer(write_queue: asyncio.Queue, table_client: TableClient) -> None:
+    """Write finished summaries in transactions of up to 100, flushing early when the queue goes quiet."""
+    pending = []
+    while True:
+        try:
+            item = await asyncio.wait_for(write_queue.get(), timeout=WRITE_FLUSH_INTERVAL_SECONDS)
+        except asyncio.TimeoutError:
+            # Nothing new for a while; don't hold finished summaries back
+            if pending:
+                await save_summaries(pending, table_client)
+                pending = []
+            continue
+        if item is None:
+            break
+        pending.append(item)
+        if len(pending) >= TABLE_TRANSACTION_MAX_OPERATIONS:
+            await save_summaries(pending, table_client)
+            pending = []
+    if pending:
+        await save_summaries(pending, table_client)
+
+async def produce_recall_items(blob_client, queue: asyncio.Queue) -> int:
+    """Stream-parse the raw recall blob onto the queue as RecallItems, ending with None.
+
+    Records repeating an earlier recall_id or identical to an earlier record are
+    dropped so each summary is generated once. Returns the number of records produced.
+    """
+    count = 0
+    seen_ids = set()
+    seen_hashes = set()
+    duplicates = 0
+    try:
+        download_stream = await blob_client.download_blob()
+        async for recall in ijson.items(download_stream, 'item', use_float=True):
+            recall_id = recall.get('recall_number') or f"recall-{count}"
+            data_json = serialize_recall_data(recall)
+            data_hash = hash_recall_data(data_json)
+            count += 1
+            if recall_id in seen_ids or data_hash in seen_hashes:
+                duplicates += 1
+                continue
+            seen_ids.add(recall_id)
+            seen_hashes.add(data_hash)
+            await queue.put(RecallItem(recall_id=recall_id, data=recall, data_json=data_json, data_hash=data_hash))
+    except Exception:
+        # Unblock the consumer; the error is re-raised when the task is awaited
+        await queue.put(None)
+        raise
+    await queue.put(None)
+    if duplicates:
+        logger.info(f"Dropped {duplicates} duplicate recall records out of {count}")
+    return count - duplicates
 
 async def process_food_recall_data(batch_size=50):
     """
-    Main function to process food recall data in batches.
+    Main function to process food recall data.
     
     Args:
-        batch_size: Number of recalls to process in a single batch
+        batch_size: Number of recalls checked for existing summaries per Table Storage round
     """
     start_time = time.time()
-    temp_file = None
+    
+    # One aiohttp session for the run, shared by the Table and Blob clients so
+    # their requests and retries reuse pooled connections. The clients don't own
+    # it, so closing them leaves it open; it is closed once when the run ends.
+    session = aiohttp.ClientSession(cookie_jar=aiohttp.DummyCookieJar(), auto_decompress=False, trust_env=True)
+    # Certificate checks stay off only for Table Storage, as before; the Blob
+    # client verifies. aiohttp keys pooled connections by SSL settings, so the two never mix.
+    table_transport = AioHttpTransport(session=session, session_owner=False, connection_verify=False)
+    blob_transport = AioHttpTransport(session=session, session_owner=False)
     
     try:
-        table_client = await get_table_client()
+        table_client = await get_table_client(table_transport)
         if not table_client:
             logger.error("Cannot proceed without Table Storage connection")
             return False
@@ -266,41 +633,49 @@ async def process_food_recall_data(batch_size=50):
         container_name = os.environ.get("AZURE_RAW_CONTAINER", "openfda-etl")
         blob_name = os.environ.get("AZURE_RAW_BLOB", "openfda_response.json")
         
-        blob_service_client = BlobServiceClient.from_connection_string(connection_string)
-        blob_client = blob_service_client.get_blob_client(container=container_name, blob=blob_name)
-        
-        # Create a temporary file to store the downloaded data
-        temp_file = tempfile.NamedTemporaryFile(delete=False, suffix='.json')
-        download_stream = blob_client.download_blob()
-        temp_file.write(download_stream.readall())
-        temp_file.close()
-        
-        # Read the data from the temporary file
-        with open(temp_file.name, 'r') as f:
-            data = json.load(f)
-        
-        total_records = len(data)
-        logger.info(f"Processing {total_records} recall records in batches of {batch_size}")
-        
-        # Convert data to RecallItem objects
-        recall_items = []
-        for i, recall in enumerate(data):
-            recall_id = recall.get('recall_number', f"recall-{i}")
-            recall_items.append(RecallItem(recall_id=recall_id, data=recall))
-        
-        # Process in batches
-        results = []
-        for i in range(0, len(recall_items), batch_size):
-            batch = recall_items[i:i+batch_size]
-            logger.info(f"Processing batch {i//batch_size + 1}/{(total_records+batch_size-1)//batch_size}")
+        async with AsyncBlobServiceClient.from_connection_string(connection_string, transport=blob_transport) as blob_service_client:
+            blob_client = blob_service_client.get_blob_client(container=container_name, blob=blob_name)
             
-            processed_batch = await process_batch(batch, table_client)            
-            results.extend(processed_batch)
+            # Pipeline: the parser feeds batched existing-summary checks, a pool of
+            # workers summarizes the misses continuously, and a writer upserts the
+            # results as they finish. Bounded queues keep each stage from running far ahead.
+            queue = asyncio.Queue(maxsize=2 * batch_size)
+            summary_queue = asyncio.Queue(maxsize=2 * batch_size)
+            write_queue = asyncio.Queue()
+            producer = asyncio.create_task(produce_recall_items(blob_client, queue))
+            workers = [asyncio.create_task(summary_worker(summary_queue, write_queue))
+                       for _ in range(_openai_limiter.maximum)]
+            writer = asyncio.create_task(summary_writer(write_queue, table_client))
             
-            # Add a small delay between batches to avoid rate limits
-            if i + batch_size < len(recall_items):
-                logger.info("Pausing between batches to avoid rate limits")
-                await asyncio.sleep(10)
+            results = []
+            batch = []
+            try:
+                while True:
+                    item = await queue.get()
+                    if item is None:
+                        break
+                    batch.append(item)
+                    if len(batch) == batch_size:
+                        await dispatch_batch(batch, table_client, summary_queue, write_queue)
+                        results.extend(batch)
+                        batch = []
+                if batch:
+                    await dispatch_batch(batch, table_client, summary_queue, write_queue)
+                    results.extend(batch)
+                
+                # Surface any download or parse error before draining the workers
+                total_records = await producer
+                logger.info(f"Parsed {total_records} recall records")
+                
+                for _ in workers:
+                    await summary_queue.put(None)
+                await asyncio.gather(*workers)
+                await write_queue.put(None)
+                await writer
+            except BaseException:
+                for task in (producer, writer, *workers):
+                    task.cancel()
+                raise
         
         # Log results
         successful = sum(1 for item in results if item.processed and not item.error)
@@ -326,13 +701,7 @@ async def process_food_recall_data(batch_size=50):
         logger.error(f"Error in main processing: {str(e)}", exc_info=True)
         return False
     finally:
-        # Clean up the temporary file
-        if temp_file and os.path.exists(temp_file.name):
-            try:
-                os.unlink(temp_file.name)
-                logger.info(f"Cleaned up temporary file: {temp_file.name}")
-            except Exception as e:
-                logger.warning(f"Error cleaning up temporary file: {str(e)}")
+        await session.close()
 
 async def main():
     """Entry point for the script."""
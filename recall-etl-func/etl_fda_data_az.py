@@ -1,16 +1,17 @@
 import os
-import requests
-import json
+import httpx
+import ijson
+import orjson
+import re
 import sys
 from datetime import datetime, timedelta
 import io
-from azure.storage.blob import BlobServiceClient
+import asyncio
+from azure.storage.blob.aio import BlobServiceClient
 from dotenv import load_dotenv
 import uuid
 import logging
-from requests.adapters import HTTPAdapter
-from urllib3.util.retry import Retry
-import tempfile
+from functools import lru_cache
 
 # Set up logging
 logging.basicConfig(
@@ -19,6 +20,43 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+BLOB_MAX_SINGLE_PUT_SIZE = 64 * 1024 * 1024
+BLOB_UPLOAD_CONCURRENCY = 8
+
+RETRY_STATUS_CODES = frozenset({429, 500, 502, 503, 504})
+
+UNASSIGNED_RECALL_PREFIX = "UN-ASSIGNED-"
+
+DATE_FIELDS = ("recall_initiation_date", "center_classification_date", "report_date")
+
+US_STATE_NAMES = {
+    "alabama": "AL", "alaska": "AK", "arizona": "AZ", "arkansas": "AR", "california": "CA",
+    "colorado": "CO", "connecticut": "CT", "delaware": "DE", "district of columbia": "DC",
+    "florida": "FL", "georgia": "GA", "hawaii": "HI", "idaho": "ID", "illinois": "IL",
+    "indiana": "IN", "iowa": "IA", "kansas": "KS", "kentucky": "KY", "louisiana": "LA",
+    "maine": "ME", "maryland": "MD", "massachusetts": "MA", "michigan": "MI", "minnesota": "MN",
+    "mississippi": "MS", "missouri": "MO", "montana": "MT", "nebraska": "NE", "nevada": "NV",
+    "new hampshire": "NH", "new jersey": "NJ", "new mexico": "NM", "new york": "NY",
+    "north carolina": "NC", "north dakota": "ND", "ohio": "OH", "oklahoma": "OK", "oregon": "OR",
+    "pennsylvania": "PA", "puerto rico": "PR", "rhode island": "RI", "south carolina": "SC",
+    "south dakota": "SD", "tennessee": "TN", "texas": "TX", "utah": "UT", "vermont": "VT",
+    "virginia": "VA", "washington": "WA", "west virginia": "WV", "wisconsin": "WI", "wyoming": "WY",
+}
+US_STATE_CODES = frozenset(US_STATE_NAMES.values())
+STATE_CODE_RE = re.compile(r"\b[A-Z]{2}\b")
+# Codes that are also common words or abbreviations ("DISTRIBUTED IN", "CA OR NV",
+# "12 CT"); they only count when they appear in a list of state codes
+AMBIGUOUS_STATE_CODES = frozenset({"IN", "OR", "ME", "OK", "HI", "OH", "CO", "ID", "MS", "CT"})
+# What may sit between two codes in a list: "CA, NV", "CA and NV", "CA, NV, and AZ", "CA/NV"
+STATE_LIST_SEPARATOR_RE = re.compile(r"\s*(?:[,;/&]|and)\s*(?:and\s+)?", re.IGNORECASE)
+# Longest names first so "West Virginia" wins over "Virginia". Names followed by
+# "City" ("Kansas City, MO") or "D.C." ("Washington, DC") are places, not states.
+STATE_NAME_RE = re.compile(
+    r"\b(" + "|".join(sorted(US_STATE_NAMES, key=len, reverse=True)) + r")\b"
+    r"(?!\s+city\b)(?!,?\s*D\.?\s*C\b)",
+    re.IGNORECASE
+)
+
 def get_config():
     """Load configuration from environment variables with defaults"""
     return {
@@ -32,60 +70,93 @@ def get_config():
         "processed_blob_name": os.getenv("AZURE_PROCESSED_BLOB", "fda-food-enforcement-jsonl.json")
     }
 
-def create_session_with_retries(retries=3, backoff_factor=0.5):
-    """Create a requests session with retry logic"""
-    session = requests.Session()
-    retry = Retry(
-        total=retries,
-        read=retries,
-        connect=retries,
-        backoff_factor=backoff_factor,
-        status_forcelist=[429, 500, 502, 503, 504],
-    )
-    adapter = HTTPAdapter(max_retries=retry)
-    session.mount("http://", adapter)
-    session.mount("https://", adapter)
-    return session
-
 def convert_date(date_str):
     """Convert YYYYMMDD string to YYYY-MM-DD format if valid."""
-    if date_str and isinstance(date_str, str) and len(date_str) == 8:
-        try:
-            return datetime.strptime(date_str, "%Y%m%d").strftime("%Y-%m-%d")
-        except ValueError:
-            return date_str  # Return original if conversion fails
+    # Slicing avoids strptime's per-call format parsing; the digit check keeps
+    # malformed values unchanged without raising
+    if isinstance(date_str, str) and len(date_str) == 8 and date_str.isdigit():
+        return f"{date_str[:4]}-{date_str[4:6]}-{date_str[6:]}"
     return date_str
 
+def extract_states(distribution_pattern):
+    """Return the sorted US state codes named in a distribution pattern."""
+    if not distribution_pattern or not isinstance(distribution_pattern, str):
+        return []
+    codes = [match for match in STATE_CODE_RE.finditer(distribution_pattern) if match.group() in US_STATE_CODES]
+    states = set()
+    for i, match in enumerate(codes):
+        code = match.group()
+        if code in AMBIGUOUS_STATE_CODES:
+            listed = (
+                (i > 0 and STATE_LIST_SEPARATOR_RE.fullmatch(distribution_pattern, codes[i - 1].end(), match.start()))
+                or (i + 1 < len(codes) and STATE_LIST_SEPARATOR_RE.fullmatch(distribution_pattern, match.end(), codes[i + 1].start()))
+            )
+            if not listed:
+                continue
+        states.add(code)
+    states.update(US_STATE_NAMES[name.lower()] for name in STATE_NAME_RE.findall(distribution_pattern))
+    return sorted(states)
+
 def parse_fda_json_for_cognitive(data):
-    """Parse FDA data for Cognitive Search indexing."""
-    temp_file = tempfile.NamedTemporaryFile(delete=False, suffix='.json', mode='w')
-    output_file = temp_file.name
+    """Parse FDA data for Cognitive Search indexing and return it as JSON lines bytes."""
+    buffer = io.BytesIO()
+    # Bind hot-loop callables to locals to skip attribute lookups per item
+    write = buffer.write
+    dumps = orjson.dumps
+    newline = b'\n'
+    date_fields = DATE_FIELDS
+    to_iso_date = convert_date
+    states_for = extract_states
     count = 0
-    try:
-        for item in data:
-            processed_item = item.copy()
-            if 'openfda' in processed_item and not processed_item['openfda']:
-                del processed_item['openfda']
-            for date_field in ["recall_initiation_date", "center_classification_date", "report_date"]:
-                if date_field in processed_item:
-                    processed_item[date_field] = convert_date(processed_item[date_field])
-            temp_file.write(json.dumps(processed_item) + '\n')
-            count += 1
-    finally:
-        temp_file.close()
+    for item in data:
+        processed_item = item.copy()
+        get = processed_item.get
+        if not get('openfda'):
+            processed_item.pop('openfda', None)
+        for date_field in date_fields:
+            value = get(date_field)
+            if value is not None:
+                processed_item[date_field] = to_iso_date(value)
+        processed_item['states'] = states_for(get('distribution_pattern'))
+        write(dumps(processed_item))
+        write(newline)
+        count += 1
             
-    logger.info(f"Converted {count} JSON objects to JSON lines format in {output_file}")
-    return output_file
+    logger.info(f"Converted {count} JSON objects to JSON lines format")
+    return buffer.getvalue()
     
     
  
-def fetch_openfda_data(base_url, api_key, api_limit):
+class ResponseByteReader:
+    """Expose an httpx streaming response through the async read() interface ijson expects."""
+    def __init__(self, response):
+        self._chunks = response.aiter_bytes()
+        self._buffer = bytearray()
+        self._exhausted = False
+
+    async def read(self, size=-1):
+        # ijson probes the stream with read(0) to detect bytes vs text; it must not consume data
+        if size == 0:
+            return b''
+        while not self._exhausted and (size < 0 or len(self._buffer) < size):
+            try:
+                self._buffer += await self._chunks.__anext__()
+            except StopAsyncIteration:
+                self._exhausted = True
+        if size < 0 or size >= len(self._buffer):
+            data = bytes(self._buffer)
+            self._buffer.clear()
+        else:
+            data = bytes(self._buffer[:size])
+            del self._buffer[:size]
+        return data
+
+async def fetch_openfda_data(base_url, api_key, api_limit, retries=3, backoff_factor=0.5, transport=None):
     """
-    Fetch data from OpenFDA API with retry logic.
-    Returns a tuple of (results, request_url).
+    Stream records from the OpenFDA API with retry logic.
+    Yields each entry of the response's "results" array as it is parsed.
+    An httpx transport may be passed in place of the default HTTP/2 one.
     """
-    session = create_session_with_retries()
-    
     # Calculate date range: today to max(100 days ago, start of current year)
     end_date = datetime.now()
     start_date = end_date - timedelta(days=100)
@@ -101,17 +172,31 @@ def fetch_openfda_data(base_url, api_key, api_limit):
     logger.info(f"Fetching data from OpenFDA API for date range: {start_date_str} to {end_date_str}")
     logger.info(f"Request URL: {url}")
     
+    if transport is None:
+        transport = httpx.AsyncHTTPTransport(retries=retries, http2=True)
     try:
-        response = session.get(url, timeout=30)
-        response.raise_for_status()
-        data = response.json()
-        results = data.get("results", [])
-        logger.info(f"Successfully fetched {len(results)} records from OpenFDA API")
-        return results, url
-    except requests.exceptions.Timeout:
+        async with httpx.AsyncClient(transport=transport, timeout=30) as client:
+            for attempt in range(retries + 1):
+                async with client.stream("GET", url) as response:
+                    # Retry throttling and server errors before any record is yielded;
+                    # connection failures are retried by the transport
+                    if response.status_code in RETRY_STATUS_CODES and attempt < retries:
+                        delay = backoff_factor * (2 ** attempt)
+                        logger.warning(f"OpenFDA API returned {response.status_code}, retrying in {delay:.1f}s")
+                        await asyncio.sleep(delay)
+                        continue
+                    response.raise_for_status()
+                    
+                    count = 0
+                    async for record in ijson.items(ResponseByteReader(response), 'results.item', use_float=True):
+                        count += 1
+                        yield record
+                    logger.info(f"Successfully fetched {count} records from OpenFDA API")
+                    return
+    except httpx.TimeoutException:
         logger.error("Request timed out. The OpenFDA API is taking too long to respond.")
         raise
-    except requests.exceptions.HTTPError as e:
+    except httpx.HTTPStatusError as e:
         if e.response.status_code == 429:
             logger.error("API rate limit exceeded. Please try again later.")
         elif e.response.status_code == 404:
@@ -119,48 +204,54 @@ def fetch_openfda_data(base_url, api_key, api_limit):
         else:
             logger.error(f"HTTP Error: {e}")
         raise
-    except requests.exceptions.RequestException as e:
+    except httpx.RequestError as e:
         logger.error(f"Error making API request: {e}")
         raise
-    except json.JSONDecodeError as e:
+    except ijson.JSONError as e:
         logger.error(f"Error decoding JSON response: {e}")
         raise
 
-def ensure_container_exists(blob_service_client, container_name):
+@lru_cache(maxsize=None)
+def get_blob_service_client(connection_string):
+    """Return a shared async BlobServiceClient for the connection string, reusing its connection pool.
+
+    Payloads up to BLOB_MAX_SINGLE_PUT_SIZE go up in a single Put Blob request;
+    anything larger is staged as blocks uploaded in parallel.
+    """
+    return BlobServiceClient.from_connection_string(
+        connection_string,
+        max_single_put_size=BLOB_MAX_SINGLE_PUT_SIZE
+    )
+
+async def ensure_container_exists(blob_service_client, container_name):
     """Ensure a storage container exists, create if it doesn't"""
     container_client = blob_service_client.get_container_client(container_name)
     try:
-        container_properties = container_client.get_container_properties()
+        await container_client.get_container_properties()
         logger.info(f"Container '{container_name}' already exists")
     except Exception:
         logger.info(f"Creating container '{container_name}'...")
-        container_client.create_container()
+        await container_client.create_container()
         logger.info(f"Container '{container_name}' created successfully")
 
-def upload_to_container(blob_service_client, container_name, blob_name, content):
+async def upload_to_container(blob_service_client, container_name, blob_name, content):
     """
     Upload the given content to the specified container and blob name.
     Ensures the container exists before uploading.
     """
-    ensure_container_exists(blob_service_client, container_name)
+    await ensure_container_exists(blob_service_client, container_name)
     
     blob_client = blob_service_client.get_blob_client(container=container_name, blob=blob_name)
-    
-    # Check content type and handle accordingly
-    if isinstance(content, str):
-        blob_client.upload_blob(content, overwrite=True)
-    else:
-        blob_client.upload_blob(content, overwrite=True)
+    await blob_client.upload_blob(content, overwrite=True, max_concurrency=BLOB_UPLOAD_CONCURRENCY)
         
     logger.info(f"Uploaded '{blob_name}' to container '{container_name}'")
 
-def download_parse_store_openfda_data():
+async def download_parse_store_openfda_data():
     """
     Download data from OpenFDA API, parse it for Azure Cognitive Search,
     and store both the raw response and the parsed file into separate Azure storage containers.
     """
     config = get_config()
-    temp_files = [] 
     
     # Validate required configuration
     if not config["api_key"]:
@@ -172,64 +263,49 @@ def download_parse_store_openfda_data():
         return False
 
     try:
-        # 1. Download openFDA data
-        results, request_url = fetch_openfda_data(
+        # 1. Download openFDA data, assigning unique numbers to records with an
+        # empty recall_number as they stream in
+        results = []
+        assigned = 0
+        async for result in fetch_openfda_data(
             config["base_url"], 
             config["api_key"], 
             config["api_limit"]
-        )
+        ):
+            if not result.get('recall_number'):
+                result['recall_number'] = f"{UNASSIGNED_RECALL_PREFIX}{uuid.uuid4().hex[:8].upper()}"
+                assigned += 1
+            results.append(result)
         
         if not results:
             logger.warning("No records returned from the API.")
             return False
             
         logger.info(f"Fetched {len(results)} records from the API.")
+        if assigned:
+            logger.info(f"Generated unique recall numbers for {assigned} records")
         
-        # Check if recall_number is empty and assign unique numbers where needed
-        for result in results:
-            if 'recall_number' not in result or not result['recall_number']:
-                unique_id = f"UN-ASSIGNED-{str(uuid.uuid4())[:8].upper()}"
-                result['recall_number'] = unique_id
-                logger.info(f"Generated unique recall number: {unique_id}")
-        
-        # Save raw JSON response to a temp file
-        json_data = json.dumps(results, indent=4)
-        
-        # Create temp file for raw data
-        temp_raw_file = tempfile.NamedTemporaryFile(delete=False, suffix='.json', mode='w')
-        temp_raw_file.write(json_data)
-        temp_raw_file.close()
-        temp_files.append(temp_raw_file.name)
-        logger.info(f"Saved raw response to temporary file: {temp_raw_file.name}")
-
-        # 2. Parse the data for Azure Cognitive Search - modify the function to use temp files
-        parsed_file_path = parse_fda_json_for_cognitive(results)
-        temp_files.append(parsed_file_path)
-        
-        with open(parsed_file_path, "rb") as pf:
-            parsed_content = pf.read()
-       
+        # 2. Serialize the raw response and parse the data for Azure Cognitive Search in memory
+        raw_content = orjson.dumps(results, option=orjson.OPT_INDENT_2)
+        parsed_content = parse_fda_json_for_cognitive(results)
 
         # 3. Upload both files into Azure Storage (different containers)
-        blob_service_client = BlobServiceClient.from_connection_string(config["connection_string"])
+        blob_service_client = get_blob_service_client(config["connection_string"])
         
-        # Upload parsed file to container
-        upload_to_container(
-            blob_service_client, 
-            config["processed_container"], 
-            config["processed_blob_name"], 
-            parsed_content
-        )
-        
-        # Upload raw JSON response to container
-        with open(temp_raw_file.name, "rb") as rf:
-            raw_content = rf.read()
-        
-        upload_to_container(
-            blob_service_client, 
-            config["raw_container"], 
-            config["raw_blob_name"], 
-            raw_content
+        # Upload the parsed file and the raw JSON response concurrently
+        await asyncio.gather(
+            upload_to_container(
+                blob_service_client, 
+                config["processed_container"], 
+                config["processed_blob_name"], 
+                parsed_content
+            ),
+            upload_to_container(
+                blob_service_client, 
+                config["raw_container"], 
+                config["raw_blob_name"], 
+                raw_content
+            )
         )
 
         logger.info("Data download, parsing, and upload completed successfully.")
@@ -238,19 +314,9 @@ def download_parse_store_openfda_data():
     except Exception as e:
         logger.error(f"Error in download_parse_store_openfda_data: {str(e)}", exc_info=True)
         return False
-    finally:
-        # Clean up temporary files
-        for temp_file in temp_files:
-            try:
-                if os.path.exists(temp_file):
-                    os.unlink(temp_file)
-                    logger.info(f"Cleaned up temporary file: {temp_file}")
-            except Exception as e:
-                logger.warning(f"Error cleaning up temporary file {temp_file}: {str(e)}")
-                
 
 if __name__ == "__main__":
     load_dotenv()
-    success = download_parse_store_openfda_data()
+    success = asyncio.run(download_parse_store_openfda_data())
     if not success:
         sys.exit(1)
\ No newline at end of file
@@ -7,10 +7,10 @@ from etl_fda_data_az import download_parse_store_openfda_data
 app = func.FunctionApp()
 
 @app.route(route="etl_fda_data", auth_level=func.AuthLevel.FUNCTION)
-def etl_fda_data(req: func.HttpRequest) -> func.HttpResponse:
+async def etl_fda_data(req: func.HttpRequest) -> func.HttpResponse:
     logging.info('Open FDA Food Recall data extraction function triggered.')
     try :
-        success = download_parse_store_openfda_data()
+        success = await download_parse_store_openfda_data()
         if success:
             return func.HttpResponse(
                 "Open FDA Food Recall data extraction completed successfully.",
@@ -103,4 +103,31 @@ async def etl_fda_indexer(req: func.HttpRequest) -> func.HttpResponse:
         return func.HttpResponse(
             f"Error: {error_message}",
             status_code=500
-        )
\ No newline at end of file
+        )
+
+@app.route(route="etl_fda_indexer_status", auth_level=func.AuthLevel.FUNCTION)
+async def etl_fda_indexer_status(req: func.HttpRequest) -> func.HttpResponse:
+    logging.info('FDA Indexer status requested.')
+    
+    try:
+        from etl_az_indexer import get_indexer_run_status
+        
+        status = await get_indexer_run_status()
+        if status is None:
+            return func.HttpResponse(
+                "Could not retrieve Azure Search indexer status. Check the logs for details.",
+                status_code=500
+            )
+        
+        return func.HttpResponse(
+            json.dumps(status),
+            status_code=200,
+            mimetype="application/json"
+        )
+    except Exception as e:
+        error_message = str(e)
+        logging.error(f"Error retrieving indexer status: {error_message}", exc_info=True)
+        return func.HttpResponse(
+            f"Error: {error_message}",
+            status_code=500
+        )
@@ -0,0 +1,74 @@
+import asyncio
+
+import httpx
+import orjson
+
+from etl_fda_data_az import ResponseByteReader, convert_date, extract_states, fetch_openfda_data
+
+RECORDS = [
+    {"recall_number": "F-0001-2025", "report_date": "20250102", "voluntary_mandated": 1.5},
+    {"recall_number": "F-0002-2025", "report_date": "20250103", "distribution_pattern": "CA, NV"},
+]
+BODY = orjson.dumps({"meta": {"results": {"total": len(RECORDS)}}, "results": RECORDS})
+
+
+def chunked_transport(body, chunk_size):
+    """Serve body as a streamed response split into chunk_size pieces."""
+    async def stream():
+        for i in range(0, len(body), chunk_size):
+            yield body[i:i + chunk_size]
+
+    def handler(request):
+        return httpx.Response(200, content=stream())
+
+    return httpx.MockTransport(handler)
+
+
+async def collect(transport):
+    return [record async for record in fetch_openfda_data("https://example.test/food/enforcement.json", "key", 10, transport=transport)]
+
+
+def test_fetch_openfda_data_parses_body_split_over_chunks():
+    for chunk_size in (1, 7, 16, len(BODY)):
+        assert asyncio.run(collect(chunked_transport(BODY, chunk_size))) == RECORDS
+
+
+def test_response_byte_reader_honours_size():
+    class Response:
+        async def aiter_bytes(self):
+            for chunk in (b"abc", b"defg", b"h"):
+                yield chunk
+
+    async def read_all():
+        reader = ResponseByteReader(Response())
+        return [await reader.read(0), await reader.read(2), await reader.read(4), await reader.read(-1), await reader.read(5)]
+
+    assert asyncio.run(read_all()) == [b"", b"ab", b"cdef", b"gh", b""]
+
+
+def test_extract_states_reads_code_lists():
+    assert extract_states("CA, NV, and AZ") == ["AZ", "CA", "NV"]
+    assert extract_states("Distributed in IN, OH and KY") == ["IN", "KY", "OH"]
+    assert extract_states("Product shipped to OR/WA") == ["OR", "WA"]
+
+
+def test_extract_states_ignores_common_words():
+    assert extract_states("DISTRIBUTED IN CA") == ["CA"]
+    assert extract_states("DISTRIBUTED IN IN, OH, KY") == ["IN", "KY", "OH"]
+    assert extract_states("Sold in CA OR NV") == ["CA", "NV"]
+    assert extract_states("OK TO SHIP TO ME") == []
+    assert extract_states("Nationwide") == []
+
+
+def test_extract_states_skips_cities_named_after_states():
+    assert extract_states("Kansas City, MO") == ["MO"]
+    assert extract_states("Washington, DC and Virginia") == ["DC", "VA"]
+    assert extract_states("Washington D.C.") == []
+    assert extract_states("Washington and Oregon") == ["OR", "WA"]
+    assert extract_states("West Virginia and Pennsylvania") == ["PA", "WV"]
+
+
+def test_convert_date():
+    assert convert_date("20250102") == "2025-01-02"
+    assert convert_date("2025-01-02") == "2025-01-02"
+    assert convert_date(None) is None